@@ -1,214 +1,345 @@
 """
 Admin endpoints for viewing database data.
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
-from typing import List, Optional
-import os
+from typing import List, Optional, Tuple
+from datetime import datetime
+import base64
+import binascii
+import hashlib
+import orjson
+import time
+import uuid
+
+from app.config import DB_CONFIGURED
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-# Check if database is configured
-# Try to load from .env file first
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+# main.py only registers this router when DB_CONFIGURED is still True
+if DB_CONFIGURED:
+    try:
+        from app.database import SessionLocal
+    except Exception as e:
+        print(f"Warning: Admin endpoints not available: {e}")
+        DB_CONFIGURED = False
 
-DB_CONFIGURED = bool(os.getenv('DB_PASSWORD') or (os.getenv('DB_NAME') and os.getenv('DB_NAME') != 'video_conferencing'))
+# /admin/stats table counts are served from memory for this many seconds
+STATS_CACHE_TTL = 5
+_stats_cache: Optional[Tuple[dict, float]] = None  # (counts, expires_at)
 
-def get_db():
-    """Get database session if configured."""
-    if not DB_CONFIGURED:
-        raise HTTPException(
-            status_code=503,
-            detail="Database not configured. Please set up PostgreSQL and configure .env file."
-        )
-    from app.database import get_db as _get_db
-    return next(_get_db())
 
+def _encode_cursor(timestamp: datetime, row_id) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque cursor."""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-@router.get("/rooms")
-async def get_all_rooms(db: Session = Depends(get_db)):
-    """Get all rooms from database."""
-    if not DB_CONFIGURED:
-        raise HTTPException(
-            status_code=503,
-            detail="Database not configured. Please set up PostgreSQL and configure .env file."
-        )
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Decode a cursor produced by _encode_cursor."""
     try:
-        result = db.execute(text("""
-            SELECT 
-                room_id,
-                created_at,
-                created_by,
-                status,
-                (SELECT COUNT(*) FROM participants WHERE room_id = rooms.room_id AND status = 'active') as participant_count
-            FROM rooms
-            ORDER BY created_at DESC
-        """))
-        
-        rooms = []
-        for row in result:
-            rooms.append({
-                "room_id": str(row[0]),
-                "created_at": row[1].isoformat() if row[1] else None,
-                "created_by": row[2],
-                "status": row[3],
-                "participant_count": row[4]
-            })
-        
-        return {"rooms": rooms, "total": len(rooms)}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _etag_response(request: Request, content: dict) -> Response:
+    """
+    Render content as JSON with an ETag of its hash.
+    Returns an empty 304 when the client's If-None-Match already has that ETag.
+    """
+    body = orjson.dumps(content, default=str)  # str() covers asyncpg's UUID type
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+
+async def _rooms_page(db, after: Optional[Tuple[datetime, uuid.UUID]], limit: int) -> dict:
+    """Fetch one page of rooms, newest first, starting after a decoded cursor position."""
+    params = {"limit": limit}
+    keyset_filter = ""
+    if after:
+        params["after_ts"], params["after_id"] = after
+        keyset_filter = "WHERE (rooms.created_at, rooms.room_id) < (CAST(:after_ts AS timestamptz), CAST(:after_id AS uuid))"
+    result = await db.execute(text(f"""
+        SELECT
+            rooms.room_id,
+            rooms.created_at,
+            rooms.created_by,
+            rooms.status,
+            COUNT(p.participant_id) FILTER (WHERE p.status = 'active') as participant_count
+        FROM rooms
+        LEFT JOIN participants p ON p.room_id = rooms.room_id
+        {keyset_filter}
+        GROUP BY rooms.room_id
+        ORDER BY rooms.created_at DESC, rooms.room_id DESC
+        LIMIT :limit
+    """), params)
+    
+    rooms = []
+    last_row = None
+    for row in result:
+        rooms.append({
+            "room_id": row[0],
+            "created_at": row[1],
+            "created_by": row[2],
+            "status": row[3],
+            "participant_count": row[4]
+        })
+        last_row = row
+    
+    next_cursor = None
+    if len(rooms) == limit and last_row[1]:
+        next_cursor = _encode_cursor(last_row[1], last_row[0])
+    
+    return {"rooms": rooms, "total": len(rooms), "next_cursor": next_cursor}
+
+
+@router.get("/rooms")
+async def get_all_rooms(
+    request: Request,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
+):
+    """
+    Get rooms from database, newest first.
+    Pass the returned `next_cursor` as `after` to fetch the next page.
+    Supports If-None-Match with the returned ETag.
+    """
+    position = _decode_cursor(after) if after else None
+    async with SessionLocal() as db:
+        try:
+            page = await _rooms_page(db, position, limit)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    return _etag_response(request, page)
 
 
 @router.get("/rooms/{room_id}")
-async def get_room_details(room_id: str, db: Session = Depends(get_db)):
-    """Get detailed information about a specific room."""
-    try:
-        # Get room info
-        room_result = db.execute(text("""
-            SELECT room_id, created_at, created_by, status
-            FROM rooms
-            WHERE room_id = :room_id
-        """), {"room_id": room_id})
-        
-        room = room_result.fetchone()
-        if not room:
-            raise HTTPException(status_code=404, detail="Room not found")
-        
-        # Get participants
-        participants_result = db.execute(text("""
-            SELECT user_id, username, joined_at, left_at, status
-            FROM participants
-            WHERE room_id = :room_id
-            ORDER BY joined_at DESC
-        """), {"room_id": room_id})
-        
-        participants = []
-        for p in participants_result:
-            participants.append({
-                "user_id": str(p[0]),
-                "username": p[1],
-                "joined_at": p[2].isoformat() if p[2] else None,
-                "left_at": p[3].isoformat() if p[3] else None,
-                "status": p[4]
-            })
-        
-        return {
-            "room_id": str(room[0]),
-            "created_at": room[1].isoformat() if room[1] else None,
-            "created_by": room[2],
-            "status": room[3],
-            "participants": participants,
-            "participant_count": len(participants)
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+async def get_room_details(request: Request, room_id: str):
+    """Get detailed information about a specific room. Supports If-None-Match with the returned ETag."""
+    async with SessionLocal() as db:
+        try:
+            # Get room info
+            room_result = await db.execute(text("""
+                SELECT room_id, created_at, created_by, status
+                FROM rooms
+                WHERE room_id = :room_id
+            """), {"room_id": room_id})
+            
+            room = room_result.fetchone()
+            if not room:
+                raise HTTPException(status_code=404, detail="Room not found")
+            
+            # Get participants
+            participants_result = await db.execute(text("""
+                SELECT user_id, username, joined_at, left_at, status
+                FROM participants
+                WHERE room_id = :room_id
+                ORDER BY joined_at DESC
+            """), {"room_id": room_id})
+            
+            participants = []
+            for p in participants_result:
+                participants.append({
+                    "user_id": p[0],
+                    "username": p[1],
+                    "joined_at": p[2],
+                    "left_at": p[3],
+                    "status": p[4]
+                })
+            
+            details = {
+                "room_id": room[0],
+                "created_at": room[1],
+                "created_by": room[2],
+                "status": room[3],
+                "participants": participants,
+                "participant_count": len(participants)
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    return _etag_response(request, details)
+
+
+class _SessionStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body reads from an open database session.
+    The session is closed once the response is over, including when the body
+    is never started (e.g. the client is gone before the headers are sent).
+    """
+    
+    def __init__(self, content, session, **kwargs):
+        super().__init__(content, **kwargs)
+        self.session = session
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.session.close()
+
+
+def _participants_query(after: Optional[Tuple[datetime, uuid.UUID]], limit: int):
+    """Build the participants page query, most recently joined first. Returns (statement, params)."""
+    params = {"limit": limit}
+    keyset_filter = ""
+    if after:
+        params["after_ts"], params["after_id"] = after
+        keyset_filter = "WHERE (joined_at, participant_id) < (CAST(:after_ts AS timestamptz), CAST(:after_id AS uuid))"
+    statement = text(f"""
+        SELECT 
+            participant_id,
+            room_id,
+            user_id,
+            username,
+            joined_at,
+            left_at,
+            status
+        FROM participants
+        {keyset_filter}
+        ORDER BY joined_at DESC, participant_id DESC
+        LIMIT :limit
+    """)
+    return statement, params
+
+
+def _participant_dict(row) -> dict:
+    """Convert a row from _participants_query to its JSON shape."""
+    return {
+        "participant_id": row[0],
+        "room_id": row[1],
+        "user_id": row[2],
+        "username": row[3],
+        "joined_at": row[4],
+        "left_at": row[5],
+        "status": row[6]
+    }
 
 
 @router.get("/participants")
-async def get_all_participants(db: Session = Depends(get_db)):
-    """Get all participants from database."""
+async def get_all_participants(
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
+):
+    """
+    Stream participants from database, most recently joined first, as NDJSON.
+    One participant object per line; the last line is
+    `{"total": ..., "next_cursor": ...}` - pass `next_cursor` as `after`
+    to fetch the next page.
+    """
+    statement, params = _participants_query(_decode_cursor(after) if after else None, limit)
+    
+    # The session outlives this handler and is closed by the response.
+    # Opening the cursor and fetching the first batch happen here, before
+    # any headers are sent, so a database failure is still a 500.
+    db = SessionLocal()
     try:
-        result = db.execute(text("""
-            SELECT 
-                participant_id,
-                room_id,
-                user_id,
-                username,
-                joined_at,
-                left_at,
-                status
-            FROM participants
-            ORDER BY joined_at DESC
-            LIMIT 100
-        """))
-        
-        participants = []
-        for row in result:
-            participants.append({
-                "participant_id": str(row[0]),
-                "room_id": str(row[1]),
-                "user_id": str(row[2]),
-                "username": row[3],
-                "joined_at": row[4].isoformat() if row[4] else None,
-                "left_at": row[5].isoformat() if row[5] else None,
-                "status": row[6]
-            })
-        
-        return {"participants": participants, "total": len(participants)}
+        # Server-side cursor: rows are fetched and sent in batches of 500
+        result = await db.stream(statement.execution_options(yield_per=500), params)
+        rows = await result.fetchmany(500)
     except Exception as e:
+        await db.close()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    async def generate(rows):
+        total = 0
+        last_row = None
+        while rows:
+            for row in rows:
+                # str() covers asyncpg's UUID type
+                yield orjson.dumps(_participant_dict(row), default=str) + b"\n"
+            total += len(rows)
+            last_row = rows[-1]
+            rows = await result.fetchmany(500)
+        
+        next_cursor = None
+        if total == limit and last_row[4]:
+            next_cursor = _encode_cursor(last_row[4], last_row[0])
+        
+        yield orjson.dumps({"total": total, "next_cursor": next_cursor}) + b"\n"
+    
+    return _SessionStreamingResponse(generate(rows), db, media_type="application/x-ndjson")
 
 
 @router.get("/sessions")
-async def get_active_sessions(db: Session = Depends(get_db)):
+async def get_active_sessions():
     """Get all active WebSocket sessions."""
-    try:
-        result = db.execute(text("""
-            SELECT 
-                session_id,
-                room_id,
-                user_id,
-                connected_at,
-                disconnected_at,
-                status
-            FROM sessions
-            WHERE status = 'connected'
-            ORDER BY connected_at DESC
-        """))
-        
-        sessions = []
-        for row in result:
-            sessions.append({
-                "session_id": str(row[0]),
-                "room_id": str(row[1]),
-                "user_id": str(row[2]),
-                "connected_at": row[3].isoformat() if row[3] else None,
-                "disconnected_at": row[4].isoformat() if row[4] else None,
-                "status": row[5]
-            })
-        
-        return {"sessions": sessions, "total": len(sessions)}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    async with SessionLocal() as db:
+        try:
+            result = await db.execute(text("""
+                SELECT 
+                    session_id,
+                    room_id,
+                    user_id,
+                    connected_at,
+                    disconnected_at,
+                    status
+                FROM sessions
+                WHERE status = 'connected'
+                ORDER BY connected_at DESC
+            """))
+            
+            sessions = []
+            for row in result:
+                sessions.append({
+                    "session_id": row[0],
+                    "room_id": row[1],
+                    "user_id": row[2],
+                    "connected_at": row[3],
+                    "disconnected_at": row[4],
+                    "status": row[5]
+                })
+            
+            return {"sessions": sessions, "total": len(sessions)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
-@router.get("/stats")
-async def get_statistics(db: Session = Depends(get_db)):
-    """Get database statistics."""
-    if not DB_CONFIGURED:
-        return {
-            "message": "Database not configured",
-            "active_rooms": 0,
-            "ended_rooms": 0,
-            "active_participants": 0,
-            "left_participants": 0,
-            "active_sessions": 0,
-            "total_rooms": 0,
-            "total_participants": 0
-        }
-    try:
-        result = db.execute(text("""
-            SELECT 
-                (SELECT COUNT(*) FROM rooms WHERE status = 'active') as active_rooms,
-                (SELECT COUNT(*) FROM rooms WHERE status = 'ended') as ended_rooms,
-                (SELECT COUNT(*) FROM participants WHERE status = 'active') as active_participants,
-                (SELECT COUNT(*) FROM participants WHERE status = 'left') as left_participants,
-                (SELECT COUNT(*) FROM sessions WHERE status = 'connected') as active_sessions,
-                (SELECT COUNT(*) FROM rooms) as total_rooms,
-                (SELECT COUNT(*) FROM participants) as total_participants
+async def _stats_counts(db) -> dict:
+    """Table counts for /admin/stats, queried only when the cached counts have expired."""
+    global _stats_cache
+    if _stats_cache is None or _stats_cache[1] < time.monotonic():
+        result = await db.execute(text("""
+            SELECT
+                r.active_rooms,
+                r.ended_rooms,
+                p.active_participants,
+                p.left_participants,
+                s.active_sessions,
+                r.total_rooms,
+                p.total_participants
+            FROM (
+                SELECT
+                    COUNT(*) FILTER (WHERE status = 'active') as active_rooms,
+                    COUNT(*) FILTER (WHERE status = 'ended') as ended_rooms,
+                    COUNT(*) as total_rooms
+                FROM rooms
+            ) r
+            CROSS JOIN (
+                SELECT
+                    COUNT(*) FILTER (WHERE status = 'active') as active_participants,
+                    COUNT(*) FILTER (WHERE status = 'left') as left_participants,
+                    COUNT(*) as total_participants
+                FROM participants
+            ) p
+            CROSS JOIN (
+                SELECT COUNT(*) as active_sessions
+                FROM sessions
+                WHERE status = 'connected'
+            ) s
         """))
         
         stats = result.fetchone()
-        
-        return {
+        _stats_cache = ({
             "active_rooms": stats[0],
             "ended_rooms": stats[1],
             "active_participants": stats[2],
@@ -216,7 +347,54 @@ async def get_statistics(db: Session = Depends(get_db)):
             "active_sessions": stats[4],
             "total_rooms": stats[5],
             "total_participants": stats[6]
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        }, time.monotonic() + STATS_CACHE_TTL)
+    return _stats_cache[0]
+
+
+@router.get("/stats")
+async def get_statistics():
+    """
+    Get database statistics.
+    Table counts may be up to STATS_CACHE_TTL seconds old; room cache stats are live.
+    If the database query fails after an earlier success, the last counts are
+    returned with "stale": true.
+    """
+    from app.room_manager_db import room_cache
+    async with SessionLocal() as db:
+        try:
+            counts = await _stats_counts(db)
+        except Exception as e:
+            if _stats_cache is None:
+                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            # Serve the last known counts, flagged, rather than failing
+            return {**_stats_cache[0], **room_cache.stats(), "stale": True}
+    
+    return {**counts, **room_cache.stats()}
+
+
+@router.get("/overview")
+async def get_overview(limit: int = Query(100, ge=1, le=500)):
+    """
+    Get stats, active rooms, and the first page of rooms and participants in one
+    response, read over a single database session.
+    Use /admin/rooms and /admin/participants with `after` for further pages.
+    """
+    from app.room_manager_db import RoomManagerDB, room_cache
+    async with SessionLocal() as db:
+        try:
+            stats = {**await _stats_counts(db), **room_cache.stats()}
+            active_rooms = await RoomManagerDB(db).get_all_rooms()
+            all_rooms = await _rooms_page(db, None, limit)
+            
+            statement, params = _participants_query(None, limit)
+            participants = [_participant_dict(row) for row in await db.execute(statement, params)]
+            
+            return {
+                "stats": stats,
+                "active_rooms": active_rooms,
+                "all_rooms": all_rooms,
+                "participants": participants
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -0,0 +1,45 @@
+"""
+Application configuration read from the environment.
+"""
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from dotenv import load_dotenv
+
+# Load environment variables (the only place .env is read)
+load_dotenv()
+
+# Check if database is configured
+# Render provides DATABASE_URL automatically when database is linked.
+# main.py clears this at startup if the database turns out to be unusable.
+USE_DATABASE = bool(os.getenv('DATABASE_URL') or (os.getenv('DB_PASSWORD') and os.getenv('DB_NAME')))
+
+# Admin endpoints are only registered when database credentials are set
+DB_CONFIGURED = bool(os.getenv('DB_PASSWORD') or (os.getenv('DB_NAME') and os.getenv('DB_NAME') != 'video_conferencing'))
+
+
+_log_listener: Optional[QueueListener] = None
+
+
+def start_logging():
+    """
+    Route log records through a queue so the stderr write happens on a
+    background thread, not on the event loop. QueueHandler still formats
+    each record's message in the thread that logs it.
+    """
+    global _log_listener
+    if _log_listener is None:
+        log_queue = queue.SimpleQueue()
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(levelname)s:  %(name)s: %(message)s"))
+        _log_listener = QueueListener(log_queue, handler)
+        logging.getLogger().addHandler(QueueHandler(log_queue))
+    _log_listener.start()
+
+
+def stop_logging():
+    """Write out any queued records and stop the background thread."""
+    if _log_listener is not None:
+        _log_listener.stop()
@@ -2,9 +2,11 @@
 Database connection and session management for PostgreSQL.
 """
 import os
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, JSON, UniqueConstraint, Index, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import uuid
@@ -26,16 +28,28 @@ if not DATABASE_URL:
     # Create database URL from individual components
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
+
+def _async_url(url: str):
+    """Point a postgres:// / postgresql:// URL at the asyncpg driver."""
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    # asyncpg takes `ssl` rather than libpq's `sslmode`
+    if "sslmode" in url.query:
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    return url
+
+
+# Create async engine (asyncpg) so queries don't block the event loop
+engine = create_async_engine(
+    _async_url(DATABASE_URL),
     pool_pre_ping=True,  # Verify connections before using
-    pool_size=10,
-    max_overflow=20
+    pool_recycle=3600,  # Replace connections before server-side idle timeouts
+    pool_size=20,
+    max_overflow=40
 )
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False keeps attributes readable after commit without a lazy reload
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -50,11 +64,22 @@ class Room(Base):
     created_by = Column(String(255), nullable=True)
     status = Column(String(50), default='active')
     settings = Column(JSON, default={})
+    
+    __table_args__ = (
+        # Keyset pagination for /admin/rooms
+        Index('idx_rooms_created_at_room_id', created_at.desc(), room_id.desc()),
+    )
 
 
 class Participant(Base):
     """Participant model for room participants."""
     __tablename__ = "participants"
+    __table_args__ = (
+        # One row per user per room; join_room upserts on this key
+        UniqueConstraint('room_id', 'user_id', name='unique_room_user'),
+        # Active-membership lookups and counts only ever touch active rows
+        Index('participants_room_status_idx', 'room_id', 'status', postgresql_where=text("status = 'active'")),
+    )
     
     participant_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     room_id = Column(UUID(as_uuid=True), ForeignKey('rooms.room_id', ondelete='CASCADE'), nullable=False)
@@ -65,9 +90,16 @@ class Participant(Base):
     status = Column(String(50), default='active')
 
 
+# Keyset pagination for /admin/participants
+Index('idx_participants_joined_at_id', Participant.joined_at.desc(), Participant.participant_id.desc())
+
+
 class Session(Base):
     """Session model for WebSocket connections."""
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index('sessions_room_status_idx', 'room_id', 'status', postgresql_where=text("status = 'connected'")),
+    )
     
     session_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     room_id = Column(UUID(as_uuid=True), ForeignKey('rooms.room_id', ondelete='CASCADE'), nullable=False)
@@ -77,13 +109,23 @@ class Session(Base):
     status = Column(String(50), default='connected')
 
 
-# Dependency to get database session
-def get_db():
-    """Get database session."""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
+def upgrade_schema(conn):
+    """
+    Bring tables that already exist up to date (run with conn.run_sync after create_all).
+    
+    create_all only creates missing tables, so constraints and indexes added
+    to the models since a database was first created are applied here. Safe
+    to run on every startup.
+    """
+    inspector = inspect(conn)
+    
+    # join_room's ON CONFLICT (room_id, user_id) needs a unique key on exactly
+    # those columns; older databases have none, or one that includes status
+    unique_keys = [set(c['column_names']) for c in inspector.get_unique_constraints('participants')]
+    unique_keys += [set(i['column_names']) for i in inspector.get_indexes('participants') if i['unique']]
+    if {'room_id', 'user_id'} not in unique_keys:
+        conn.execute(text("CREATE UNIQUE INDEX participants_room_user_key ON participants (room_id, user_id)"))
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
@@ -0,0 +1,33 @@
+"""
+Room manager selection shared by the HTTP endpoints and the WebSocket handler.
+"""
+from contextlib import asynccontextmanager
+from app import config
+from app.room_manager import room_manager
+
+if config.USE_DATABASE:
+    try:
+        from app.database import SessionLocal
+        from app.room_manager_db import RoomManagerDB
+    except Exception as e:
+        print(f"⚠️  Database connection failed: {e}")
+        print("⚠️  Falling back to in-memory storage")
+        config.USE_DATABASE = False
+else:
+    print("ℹ️  Using in-memory storage (PostgreSQL not configured)")
+
+
+@asynccontextmanager
+async def room_manager_session():
+    """Open the active room manager: DB-backed on a pooled session, or the in-memory one."""
+    if config.USE_DATABASE:
+        async with SessionLocal() as db:
+            yield RoomManagerDB(db)
+    else:
+        yield room_manager
+
+
+async def get_room_manager():
+    """FastAPI dependency providing a room manager for one request."""
+    async with room_manager_session() as rooms:
+        yield rooms
@@ -2,67 +2,88 @@
 Room management logic for handling video conference rooms.
 """
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict, Set, Optional
 from app.models import RoomInfo
 
 
+@dataclass(slots=True)
+class RoomState:
+    """Participants and creation time of one in-memory room."""
+    created_at: datetime
+    participants: Set[str] = field(default_factory=set)
+
+
 class RoomManager:
-    """Manages video conference rooms and their participants."""
+    """
+    Manages video conference rooms and their participants.
+    Methods are async to match RoomManagerDB, so callers can use either one.
+    """
     
     def __init__(self):
-        # Store room_id -> set of user_ids
-        self.rooms: Dict[str, Set[str]] = {}
-        # Store room creation timestamps
-        self.room_timestamps: Dict[str, datetime] = {}
+        # Store room_id -> participants and creation timestamp
+        self.rooms: Dict[str, RoomState] = {}
     
-    def create_room(self) -> str:
+    async def create_room(self) -> str:
         """Create a new room and return its ID."""
         room_id = str(uuid.uuid4())
-        self.rooms[room_id] = set()
-        self.room_timestamps[room_id] = datetime.now()
+        self.rooms[room_id] = RoomState(created_at=datetime.now())
         return room_id
     
-    def join_room(self, room_id: str, user_id: str) -> bool:
+    async def join_room(self, room_id: str, user_id: str) -> bool:
         """Add a user to a room. Returns True if successful, False if room doesn't exist."""
-        if room_id not in self.rooms:
+        room = self.rooms.get(room_id)
+        if room is None:
             return False
-        self.rooms[room_id].add(user_id)
+        room.participants.add(user_id)
         return True
     
-    def leave_room(self, room_id: str, user_id: str):
+    async def leave_room(self, room_id: str, user_id: str):
         """Remove a user from a room."""
-        if room_id in self.rooms:
-            self.rooms[room_id].discard(user_id)
-            # Clean up empty rooms
-            if not self.rooms[room_id]:
-                self._remove_room(room_id)
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        room.participants.discard(user_id)
+        # Clean up empty rooms
+        if not room.participants:
+            self._remove_room(room_id)
     
-    def get_room_participants(self, room_id: str) -> Set[str]:
+    async def get_room_participants(self, room_id: str) -> Set[str]:
         """Get all participants in a room."""
-        return self.rooms.get(room_id, set())
+        room = self.rooms.get(room_id)
+        return room.participants if room is not None else set()
     
-    def room_exists(self, room_id: str) -> bool:
+    async def room_exists(self, room_id: str) -> bool:
         """Check if a room exists."""
         return room_id in self.rooms
     
-    def get_all_rooms(self) -> list[RoomInfo]:
+    async def get_all_rooms(self) -> list[RoomInfo]:
         """Get information about all active rooms."""
         return [
             RoomInfo(
                 room_id=room_id,
-                participant_count=len(participants),
-                created_at=self.room_timestamps[room_id].isoformat()
+                participant_count=len(room.participants),
+                created_at=room.created_at.isoformat()
             )
-            for room_id, participants in self.rooms.items()
+            for room_id, room in self.rooms.items()
         ]
     
+    async def get_room_info(self, room_id: str) -> Optional[dict]:
+        """Get detailed information about a specific room."""
+        room = self.rooms.get(room_id)
+        if room is None:
+            return None
+        return {
+            "room_id": room_id,
+            "participant_count": len(room.participants),
+            "participants": list(room.participants),
+            "exists": True
+        }
+    
     def _remove_room(self, room_id: str):
         """Remove a room from the system."""
-        if room_id in self.rooms:
-            del self.rooms[room_id]
-        if room_id in self.room_timestamps:
-            del self.room_timestamps[room_id]
+        self.rooms.pop(room_id, None)
 
 
 # Global room manager instance
@@ -1,21 +1,352 @@
 """
 Database-backed room management for PostgreSQL.
 """
+import asyncio
+import logging
+import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, Set, Optional, List
-from sqlalchemy.orm import Session
-from app.database import get_db, Room, Participant, Session as DBSession
+from typing import Dict, Set, Optional, List, Tuple
+from sqlalchemy import select, update, func, exists, bindparam, values, column, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import SessionLocal, Room, Participant, Session as DBSession
 from app.models import RoomInfo
 
+logger = logging.getLogger(__name__)
+
+
+# Statements are built once at import time and executed with bound values,
+# so each call skips statement construction and hits SQLAlchemy's compiled cache.
+
+# Status column only: enough for room_exists and its cache, no Room object built
+SELECT_ROOM_STATUS = select(Room.status).where(Room.room_id == bindparam('room_id'))
+
+SELECT_ACTIVE_PARTICIPANTS = select(Participant).where(
+    Participant.room_id == bindparam('room_id'),
+    Participant.status == 'active'
+)
+
+SELECT_ACTIVE_ROOMS_WITH_COUNTS = (
+    select(
+        Room.room_id,
+        Room.created_at,
+        func.count(Participant.participant_id).filter(Participant.status == 'active')
+    )
+    .outerjoin(Participant, Participant.room_id == Room.room_id)
+    .where(Room.status == 'active')
+    .group_by(Room.room_id)
+)
+
+
+def _join_room_statement():
+    """
+    Insert the participant (or reactivate their row) only while the room is
+    active. The unique (room_id, user_id) constraint settles concurrent joins
+    instead of a read-then-write check.
+    """
+    room_is_active = exists().where(
+        Room.room_id == bindparam('room_id'),
+        Room.status == 'active'
+    )
+    # Target the Core table: executing an ORM insert() with a parameter
+    # dict would switch the session into ORM bulk-insert mode
+    stmt = insert(Participant.__table__).from_select(
+        ['participant_id', 'room_id', 'user_id', 'username', 'status'],
+        select(
+            bindparam('participant_id', type_=Participant.participant_id.type),
+            bindparam('room_id', type_=Participant.room_id.type),
+            bindparam('user_id', type_=Participant.user_id.type),
+            bindparam('username', type_=Participant.username.type),
+            bindparam('status', 'active', type_=Participant.status.type)
+        ).where(room_is_active)
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=['room_id', 'user_id'],
+        set_={'status': 'active', 'left_at': None, 'username': stmt.excluded.username}
+    ).returning(Participant.participant_id)
+
+
+JOIN_ROOM = _join_room_statement()
+
+
+def _join_room_batch_statement(rows: list):
+    """Multi-row form of JOIN_ROOM for (participant_id, room_id, user_id, username) tuples."""
+    joins = values(
+        column('participant_id', Participant.participant_id.type),
+        column('room_id', Participant.room_id.type),
+        column('user_id', Participant.user_id.type),
+        column('username', Participant.username.type),
+        name='joins'
+    ).data(rows)
+    room_is_active = exists().where(
+        Room.room_id == joins.c.room_id,
+        Room.status == 'active'
+    )
+    stmt = insert(Participant.__table__).from_select(
+        ['participant_id', 'room_id', 'user_id', 'username', 'status'],
+        select(
+            joins.c.participant_id,
+            joins.c.room_id,
+            joins.c.user_id,
+            joins.c.username,
+            literal('active', Participant.status.type)
+        ).where(room_is_active)
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=['room_id', 'user_id'],
+        set_={'status': 'active', 'left_at': None, 'username': stmt.excluded.username}
+    )
+
+# Taken before LEAVE_ROOM in the same transaction. Concurrent leaves of one
+# room queue on this lock, so each LEAVE_ROOM starts after the previous one
+# has committed and its snapshot sees that participant as already left.
+LOCK_ROOM = select(Room.room_id).where(Room.room_id == bindparam('room_id')).with_for_update()
+
+
+def _leave_room_statement():
+    """
+    Mark the participant as left and end the room if nobody else is still
+    active, as one UPDATE ... RETURNING with the participant update in a
+    CTE. Data-modifying CTEs share the statement snapshot, so the
+    remaining-participants check has to exclude the leaving user explicitly,
+    and must run with LOCK_ROOM held to see other leaves in progress.
+    Returns the room_id only when the room was ended.
+    """
+    # Bind names must not clash with column names in an UPDATE
+    room_id, user_id = bindparam('leave_room_id'), bindparam('leave_user_id')
+    left_participant = (
+        update(Participant.__table__)
+        .where(
+            Participant.room_id == room_id,
+            Participant.user_id == user_id,
+            Participant.status == 'active'
+        )
+        .values(status='left', left_at=func.now())
+        .returning(Participant.room_id)
+        .cte('left_participant')
+    )
+    others_active = exists().where(
+        Participant.room_id == room_id,
+        Participant.status == 'active',
+        Participant.user_id != user_id
+    )
+    return (
+        update(Room.__table__)
+        .where(Room.room_id == room_id, Room.status == 'active', ~others_active)
+        .values(status='ended')
+        .returning(Room.room_id)
+        .add_cte(left_participant)
+    )
+
+
+LEAVE_ROOM = _leave_room_statement()
+
+# How long cached room state is trusted before going back to PostgreSQL
+ROOM_CACHE_TTL = 300
+# Expired entries are swept once a cache map grows past this many rooms
+ROOM_CACHE_MAX_ROOMS = 10000
+
+
+class RoomCache:
+    """
+    In-process cache of room status.
+    
+    Kept up to date by RoomManagerDB's own writes; entries expire after
+    ROOM_CACHE_TTL seconds so changes made outside this process (admin
+    scripts, manual SQL) are eventually picked up.
+    """
+    
+    def __init__(self, ttl: float = ROOM_CACHE_TTL):
+        self.ttl = ttl
+        # room_id -> (status, expires_at)
+        self.status: Dict[uuid.UUID, Tuple[str, float]] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def _lookup(self, entries: dict, room_uuid: uuid.UUID):
+        entry = entries.get(room_uuid)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+    
+    def _store(self, entries: dict, room_uuid: uuid.UUID, value):
+        if len(entries) >= ROOM_CACHE_MAX_ROOMS:
+            now = time.monotonic()
+            for key in [k for k, (_, expires_at) in entries.items() if expires_at < now]:
+                del entries[key]
+            if len(entries) >= ROOM_CACHE_MAX_ROOMS:
+                entries.clear()
+        entries[room_uuid] = (value, time.monotonic() + self.ttl)
+    
+    def get_status(self, room_uuid: uuid.UUID) -> Optional[str]:
+        """Cached room status, or None on a miss."""
+        return self._lookup(self.status, room_uuid)
+    
+    def set_status(self, room_uuid: uuid.UUID, status: str):
+        self._store(self.status, room_uuid, status)
+    
+    def end_room(self, room_uuid: uuid.UUID):
+        self.set_status(room_uuid, 'ended')
+    
+    def stats(self) -> dict:
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
+
+# Global room cache instance
+room_cache = RoomCache()
+
+SELECT_ACTIVE_ROOM_IDS = (
+    select(Room.room_id)
+    .where(Room.status == 'active')
+    .order_by(Room.created_at.desc())
+    .limit(ROOM_CACHE_MAX_ROOMS)
+)
+
+
+async def warm_room_cache(db: AsyncSession):
+    """Seed room_cache with active rooms so the first connects after startup skip the DB."""
+    for room_uuid in await db.scalars(SELECT_ACTIVE_ROOM_IDS):
+        room_cache.set_status(room_uuid, 'active')
+
+
+# Joins arriving within this many seconds of each other share one INSERT
+JOIN_BATCH_WINDOW = 0.005
+# Queued by flush_pending to wake an idle runner so it can exit
+_STOP = object()
+
+
+class ParticipantJoinBatcher:
+    """
+    Coalesces participant joins into multi-row upserts.
+    
+    Used on the WebSocket connect path, which only needs the join recorded,
+    not its result. leave_room waits for every pending join to its room, so
+    a leave never runs ahead of a join it could otherwise miss (its own, or
+    another user's that keeps the room open).
+    """
+    
+    def __init__(self, window: float = JOIN_BATCH_WINDOW):
+        self.window = window
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # room_id -> future resolved once the joins queued for that room are committed
+        self.pending: Dict[uuid.UUID, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+    
+    def submit(self, room_id: str, user_id: str, username: Optional[str] = None):
+        """Queue a join; it is written with the next batch."""
+        try:
+            room_uuid = uuid.UUID(room_id)
+            user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
+        except ValueError:
+            return
+        
+        if room_uuid not in self.pending:
+            self.pending[room_uuid] = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((uuid.uuid4(), room_uuid, user_uuid, username))
+        
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def wait_for_room(self, room_uuid: uuid.UUID):
+        """Wait until every join queued so far for this room has been written."""
+        future = self.pending.get(room_uuid)
+        if future is not None:
+            await asyncio.shield(future)
+    
+    async def flush_pending(self):
+        """Write everything queued so far and stop the runner (used on shutdown)."""
+        if self._task is not None and not self._task.done():
+            # Let the runner finish the batch it holds and exit; cancelling it
+            # could drop joins it has already taken off the queue
+            self._stopping = True
+            self.queue.put_nowait(_STOP)  # wakes it if idle
+            try:
+                await self._task
+            finally:
+                self._stopping = False
+        self._task = None
+        await self._flush(*self._drain([]))
+    
+    def _drain(self, batch: list) -> Tuple[list, list]:
+        """
+        Take everything queued, along with the pending futures for its rooms.
+        Joins submitted after this get a new future, resolved by a later batch.
+        """
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        batch = [row for row in batch if row is not _STOP]
+        rooms = {row[1] for row in batch}
+        return batch, [self.pending.pop(room_uuid) for room_uuid in rooms if room_uuid in self.pending]
+    
+    async def _run(self):
+        while not self._stopping:
+            first = await self.queue.get()
+            if first is not _STOP:
+                await asyncio.sleep(self.window)
+            await self._flush(*self._drain([first]))
+    
+    async def _flush(self, batch: list, futures: list):
+        if not batch:
+            return
+        # ON CONFLICT cannot touch the same row twice in one statement
+        rows = list({(row[1], row[2]): row for row in batch}.values())
+        try:
+            async with SessionLocal() as db:
+                await db.execute(_join_room_batch_statement(rows))
+                await db.commit()
+        except Exception as e:
+            logger.warning("Error writing participant joins: %s", e)
+        finally:
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+
+
+# Global join batcher instance
+participant_batcher = ParticipantJoinBatcher()
+
+# room_id -> [lock, holders and waiters]; entries are dropped when unused
+_room_locks: Dict[str, list] = {}
+
+
+@asynccontextmanager
+async def room_membership_lock(room_id: str):
+    """
+    Serialize membership changes to one room within this process.
+    
+    The WebSocket connect path holds it across room_exists and its join
+    submission, and leave_room across deciding whether to end the room, so
+    a join either reaches the batcher before a leave looks, or sees the
+    room the leave ended.
+    """
+    entry = _room_locks.get(room_id)
+    if entry is None:
+        entry = _room_locks[room_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _room_locks[room_id]
+
 
 class RoomManagerDB:
     """Manages video conference rooms using PostgreSQL database."""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def create_room(self, created_by: Optional[str] = None) -> str:
+    async def create_room(self, created_by: Optional[str] = None) -> str:
         """Create a new room and return its ID."""
         room = Room(
             room_id=uuid.uuid4(),
@@ -23,43 +354,29 @@ class RoomManagerDB:
             status='active'
         )
         self.db.add(room)
-        self.db.commit()
-        self.db.refresh(room)
+        await self.db.commit()
+        room_cache.set_status(room.room_id, 'active')
         return str(room.room_id)
     
-    def join_room(self, room_id: str, user_id: str, username: Optional[str] = None) -> bool:
+    async def join_room(self, room_id: str, user_id: str, username: Optional[str] = None) -> bool:
         """Add a user to a room. Returns True if successful, False if room doesn't exist."""
         try:
             room_uuid = uuid.UUID(room_id)
         except ValueError:
             return False
         
-        # Check if room exists
-        room = self.db.query(Room).filter(Room.room_id == room_uuid).first()
-        if not room or room.status != 'active':
-            return False
-        
-        # Check if participant already exists
         user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-        existing = self.db.query(Participant).filter(
-            Participant.room_id == room_uuid,
-            Participant.user_id == user_uuid,
-            Participant.status == 'active'
-        ).first()
-        
-        if not existing:
-            participant = Participant(
-                room_id=room_uuid,
-                user_id=user_uuid,
-                username=username,
-                status='active'
-            )
-            self.db.add(participant)
-            self.db.commit()
         
-        return True
+        joined = (await self.db.execute(JOIN_ROOM, {
+            'participant_id': uuid.uuid4(),
+            'room_id': room_uuid,
+            'user_id': user_uuid,
+            'username': username
+        })).first()
+        await self.db.commit()
+        return joined is not None
     
-    def leave_room(self, room_id: str, user_id: str):
+    async def leave_room(self, room_id: str, user_id: str):
         """Remove a user from a room."""
         try:
             room_uuid = uuid.UUID(room_id)
@@ -67,100 +384,83 @@ class RoomManagerDB:
         except ValueError:
             return
         
-        # Mark participant as left
-        participant = self.db.query(Participant).filter(
-            Participant.room_id == room_uuid,
-            Participant.user_id == user_uuid,
-            Participant.status == 'active'
-        ).first()
-        
-        if participant:
-            participant.status = 'left'
-            participant.left_at = datetime.utcnow()
-            self.db.commit()
-        
-        # Check if room is empty and mark as ended if needed
-        active_count = self.db.query(Participant).filter(
-            Participant.room_id == room_uuid,
-            Participant.status == 'active'
-        ).count()
-        
-        if active_count == 0:
-            room = self.db.query(Room).filter(Room.room_id == room_uuid).first()
-            if room:
-                room.status = 'ended'
-                self.db.commit()
-    
-    def get_room_participants(self, room_id: str) -> Set[str]:
-        """Get all active participants in a room."""
+        async with room_membership_lock(room_id):
+            # Joins to this room (this user's, or someone keeping the room open)
+            # may still be sitting in the batcher; write them before deciding
+            await participant_batcher.wait_for_room(room_uuid)
+            
+            # Mark the participant as left and end the room if it is now empty
+            await self.db.execute(LOCK_ROOM, {'room_id': room_uuid})
+            ended = (await self.db.execute(LEAVE_ROOM, {
+                'leave_room_id': room_uuid,
+                'leave_user_id': user_uuid
+            })).first()
+            await self.db.commit()
+            if ended is not None:
+                room_cache.end_room(room_uuid)
+    
+    async def get_room_participants(self, room_id: str) -> Set[str]:
+        """Get the user ids of all active participants in a room."""
         try:
             room_uuid = uuid.UUID(room_id)
         except ValueError:
             return set()
         
-        participants = self.db.query(Participant).filter(
-            Participant.room_id == room_uuid,
-            Participant.status == 'active'
-        ).all()
+        participants = (await self.db.scalars(
+            SELECT_ACTIVE_PARTICIPANTS, {'room_id': room_uuid}
+        )).all()
         
         return {str(p.user_id) for p in participants}
     
-    def room_exists(self, room_id: str) -> bool:
+    async def room_exists(self, room_id: str) -> bool:
         """Check if a room exists and is active."""
         try:
             room_uuid = uuid.UUID(room_id)
         except ValueError:
             return False
         
-        room = self.db.query(Room).filter(
-            Room.room_id == room_uuid,
-            Room.status == 'active'
-        ).first()
-        
-        return room is not None
+        status = room_cache.get_status(room_uuid)
+        if status is None:
+            status = await self.db.scalar(SELECT_ROOM_STATUS, {'room_id': room_uuid})
+            if status is None:
+                return False
+            room_cache.set_status(room_uuid, status)
+        return status == 'active'
     
-    def get_all_rooms(self) -> List[RoomInfo]:
+    async def get_all_rooms(self) -> List[RoomInfo]:
         """Get information about all active rooms."""
-        rooms = self.db.query(Room).filter(Room.status == 'active').all()
+        # Single aggregate query instead of one COUNT per room
+        rows = (await self.db.execute(SELECT_ACTIVE_ROOMS_WITH_COUNTS)).all()
         
-        result = []
-        for room in rooms:
-            participant_count = self.db.query(Participant).filter(
-                Participant.room_id == room.room_id,
-                Participant.status == 'active'
-            ).count()
-            
-            result.append(RoomInfo(
-                room_id=str(room.room_id),
+        return [
+            RoomInfo(
+                room_id=str(room_id),
                 participant_count=participant_count,
-                created_at=room.created_at.isoformat() if room.created_at else datetime.utcnow().isoformat()
-            ))
-        
-        return result
+                created_at=created_at.isoformat() if created_at else datetime.utcnow().isoformat()
+            )
+            for room_id, created_at, participant_count in rows
+        ]
     
-    def get_room_info(self, room_id: str) -> Optional[dict]:
+    async def get_room_info(self, room_id: str) -> Optional[dict]:
         """Get detailed information about a specific room."""
         try:
             room_uuid = uuid.UUID(room_id)
         except ValueError:
             return None
         
-        room = self.db.query(Room).filter(Room.room_id == room_uuid).first()
+        room = await self.db.get(Room, room_uuid)
         if not room:
             return None
         
-        participants = self.db.query(Participant).filter(
-            Participant.room_id == room_uuid,
-            Participant.status == 'active'
-        ).all()
+        participants = (await self.db.scalars(
+            SELECT_ACTIVE_PARTICIPANTS, {'room_id': room_uuid}
+        )).all()
         
         return {
-            'room_id': str(room.room_id),
+            'room_id': room.room_id,
             'participant_count': len(participants),
-            'participants': [str(p.user_id) for p in participants],
-            'created_at': room.created_at.isoformat() if room.created_at else None,
+            'participants': [p.user_id for p in participants],
+            'created_at': room.created_at,
             'status': room.status,
             'exists': True
         }
-
-
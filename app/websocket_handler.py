@@ -1,86 +1,104 @@
 """
 WebSocket connection handler for WebRTC signaling.
 """
-import json
-import uuid
+import asyncio
+import contextlib
+import logging
 import os
+import uuid
+import orjson
+from collections import deque
 from typing import Dict, Set
 from fastapi import WebSocket, WebSocketDisconnect
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from app import config
+from app.dependencies import room_manager_session
+from app.room_manager import room_manager
+
+if config.USE_DATABASE:
+    from app.room_manager_db import participant_batcher, room_membership_lock
+
+logger = logging.getLogger(__name__)
+
+# Signaling message types clients may send
+VALID_MESSAGE_TYPES = frozenset({"offer", "answer", "ice-candidate", "join", "leave", "emoji", "mute-status"})
+INVALID_TYPE_ERROR = "Invalid message type. Must be one of: " + ", ".join(sorted(VALID_MESSAGE_TYPES))
 
-# Check if database is configured
-# Render provides DATABASE_URL automatically when database is linked
-USE_DATABASE = bool(os.getenv('DATABASE_URL') or (os.getenv('DB_PASSWORD') and os.getenv('DB_NAME')))
 
-if USE_DATABASE:
-    try:
-        from app.database import get_db
-        from app.room_manager_db import RoomManagerDB
-        # Will get db session per request
-    except Exception:
-        USE_DATABASE = False
-        from app.room_manager import room_manager
-else:
-    from app.room_manager import room_manager
+# User ids are cut from one os.urandom read per this many connections
+USER_ID_BATCH = 256
+_user_uuids: deque = deque()
+
+
+def _next_user_uuid() -> uuid.UUID:
+    """Equivalent to uuid.uuid4(), but reads random bytes in batches."""
+    if not _user_uuids:
+        buf = os.urandom(16 * USER_ID_BATCH)
+        _user_uuids.extend(uuid.UUID(bytes=buf[i:i + 16], version=4) for i in range(0, len(buf), 16))
+    return _user_uuids.popleft()
+
+
+# Outgoing messages buffered per connection; a peer that falls this far
+# behind (e.g. its TCP window stays full) is closed rather than buffered for
+SEND_QUEUE_SIZE = 256
+# Limits on one batch frame; whatever is left goes out in the next frame
+MAX_BATCH_MESSAGES = 64
+MAX_BATCH_BYTES = 64 * 1024
 
 
 class ConnectionManager:
     """Manages WebSocket connections for signaling."""
     
     def __init__(self):
-        # Store room_id -> set of WebSocket connections
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # Store room_id -> {user_id: WebSocket} for every connection in the room
+        self.room_users: Dict[str, Dict[str, WebSocket]] = {}
         # Store WebSocket -> (room_id, user_id) mapping
         self.connection_info: Dict[WebSocket, tuple[str, str]] = {}
+        # Store WebSocket -> queue of encoded outgoing messages and the task draining it
+        self.send_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self.writer_tasks: Dict[WebSocket, asyncio.Task] = {}
+        # Tasks dropping connections that fell behind (see _close_slow_connection)
+        self.closing_tasks: Set[asyncio.Task] = set()
     
     async def connect(self, websocket: WebSocket, room_id: str) -> str:
         """Connect a WebSocket to a room. Returns the user_id."""
-        # Check if room exists
-        if USE_DATABASE:
-            db = next(get_db())
-            try:
-                db_manager = RoomManagerDB(db)
-                if not db_manager.room_exists(room_id):
-                    await websocket.close(code=1008, reason="Room does not exist")
-                    raise ValueError("Room does not exist")
-            finally:
-                db.close()
-        else:
-            if not room_manager.room_exists(room_id):
-                await websocket.close(code=1008, reason="Room does not exist")
-                raise ValueError("Room does not exist")
+        user_uuid = _next_user_uuid()
+        user_id = str(user_uuid)
+        
+        # Check the room and join it with no leave of the same room running in
+        # between (see room_membership_lock), and before the handshake yields
+        membership = room_membership_lock(room_id) if config.USE_DATABASE else contextlib.nullcontext()
+        async with membership:
+            # Check if room exists
+            async with room_manager_session() as rooms:
+                exists = await rooms.room_exists(room_id)
+            
+            if exists:
+                # Registered first so disconnect() undoes the join if accept() fails
+                self.connection_info[websocket] = (room_id, user_id)
+                # Join room in room manager
+                if config.USE_DATABASE:
+                    # Written with the next batch of joins; nothing here needs the row
+                    participant_batcher.submit(room_id, user_uuid)
+                else:
+                    await room_manager.join_room(room_id, user_id)
+        
+        if not exists:
+            await websocket.close(code=1008, reason="Room does not exist")
+            raise ValueError("Room does not exist")
         
         await websocket.accept()
-        user_id = str(uuid.uuid4())
+        
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.send_queues[websocket] = queue
+        self.writer_tasks[websocket] = asyncio.create_task(self._writer(websocket, queue))
+        
+        # Get existing participants in the room (before adding the new user)
+        room_users = self.room_users.setdefault(room_id, {})
+        existing_participants = list(room_users)
         
         # Add connection to room
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = set()
-        self.active_connections[room_id].add(websocket)
-        self.connection_info[websocket] = (room_id, user_id)
-        
-        # Join room in room manager
-        if USE_DATABASE:
-            db = next(get_db())
-            try:
-                db_manager = RoomManagerDB(db)
-                db_manager.join_room(room_id, user_id)
-            finally:
-                db.close()
-        else:
-            room_manager.join_room(room_id, user_id)
-        
-        # Get existing participants in the room (excluding the new user)
-        existing_participants = []
-        if room_id in self.active_connections:
-            for conn in self.active_connections[room_id]:
-                if conn != websocket:
-                    conn_room_id, conn_user_id = self.connection_info.get(conn, (None, None))
-                    if conn_room_id == room_id:
-                        existing_participants.append(conn_user_id)
+        room_users[user_id] = websocket
         
         # Send existing participants to the new user
         if existing_participants:
@@ -103,58 +121,126 @@ class ConnectionManager:
         
         return user_id
     
-    def disconnect(self, websocket: WebSocket):
-        """Remove a WebSocket connection."""
-        if websocket not in self.connection_info:
-            return
+    async def disconnect(self, websocket: WebSocket) -> tuple[str, str] | None:
+        """Remove a WebSocket connection. Returns (room_id, user_id), or None if it was not registered."""
+        info = self.connection_info.pop(websocket, None)
+        if info is None:
+            return None
         
-        room_id, user_id = self.connection_info[websocket]
+        room_id, user_id = info
         
         # Remove from active connections
-        if room_id in self.active_connections:
-            self.active_connections[room_id].discard(websocket)
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
+        room_users = self.room_users.get(room_id)
+        if room_users is not None:
+            room_users.pop(user_id, None)
+            if not room_users:
+                del self.room_users[room_id]
         
-        del self.connection_info[websocket]
+        self.send_queues.pop(websocket, None)
+        writer = self.writer_tasks.pop(websocket, None)
+        if writer is not None:
+            writer.cancel()
         
-        if USE_DATABASE:
-            db = next(get_db())
-            try:
-                db_manager = RoomManagerDB(db)
-                db_manager.leave_room(room_id, user_id)
-            finally:
-                db.close()
-        else:
-            room_manager.leave_room(room_id, user_id)
+        async with room_manager_session() as rooms:
+            await rooms.leave_room(room_id, user_id)
         
         return room_id, user_id
     
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        """Send a message to a specific WebSocket connection."""
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        """
+        Send queued messages for one connection.
+        Whatever is queued in the same loop tick, or piles up while a send is
+        in flight, goes out together as one {"type": "batch", "messages": [...]} frame,
+        up to MAX_BATCH_MESSAGES messages or about MAX_BATCH_BYTES per frame.
+        """
+        while True:
+            batch = [await queue.get()]
+            size = len(batch[0])
+            # Yield one loop tick so every broadcast issued in this tick
+            # joins the same frame, giving one transport write per tick
+            await asyncio.sleep(0)
+            while len(batch) < MAX_BATCH_MESSAGES and size < MAX_BATCH_BYTES:
+                try:
+                    payload = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                batch.append(payload)
+                size += len(payload)
+            
+            # Messages are already encoded; a batch just splices them together
+            if len(batch) == 1:
+                payload = batch[0]
+            else:
+                payload = b'{"type":"batch","messages":[' + b",".join(batch) + b"]}"
+            try:
+                await websocket.send_text(payload.decode())
+            except Exception as e:
+                # The receive loop sees the closed socket and runs disconnect()
+                logger.warning("Error sending to connection: %s", e)
+                return
+    
+    def _enqueue(self, websocket: WebSocket, payload: bytes):
+        """Queue an encoded message for a connection's writer; dropped if the connection has no queue."""
+        queue = self.send_queues.get(websocket)
+        if queue is None:
+            return
         try:
-            await websocket.send_json(message)
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self._close_slow_connection(websocket)
+    
+    def _close_slow_connection(self, websocket: WebSocket):
+        """Stop buffering for a connection that isn't keeping up, and drop it."""
+        logger.warning("Dropping connection with %d unsent messages", SEND_QUEUE_SIZE)
+        # Without a queue, further messages for it are discarded
+        self.send_queues.pop(websocket, None)
+        task = asyncio.create_task(self._drop(websocket))
+        self.closing_tasks.add(task)
+        task.add_done_callback(self.closing_tasks.discard)
+    
+    async def _drop(self, websocket: WebSocket):
+        """
+        Remove a connection that fell too far behind from its room, then close it.
+        The close frame can't go out until the peer reads again (or the server's
+        keepalive gives up on it), so the room is updated first.
+        """
+        info = await self.disconnect(websocket)
+        if info is not None:
+            room_id, user_id = info
+            await self.broadcast_to_room(room_id, {
+                "type": "user-left",
+                "user_id": user_id,
+                "room_id": room_id
+            })
+        try:
+            await websocket.close(code=1013, reason="Too many unsent messages")
         except Exception as e:
-            print(f"Error sending personal message: {e}")
+            logger.warning("Error closing connection: %r", e)
+    
+    async def send_personal_message(self, message: dict, websocket: WebSocket):
+        """Send a message to a specific WebSocket connection."""
+        self._enqueue(websocket, orjson.dumps(message))
     
     async def broadcast_to_room(self, room_id: str, message: dict, exclude_websocket: WebSocket = None):
         """Broadcast a message to all connections in a room."""
-        if room_id not in self.active_connections:
+        room_users = self.room_users.get(room_id)
+        if not room_users:
             return
         
-        disconnected = []
-        for connection in self.active_connections[room_id]:
+        # Encode once and share the bytes with every recipient
+        payload = orjson.dumps(message)
+        
+        # 1:1 call: the only recipient is the sender's peer
+        if exclude_websocket is not None and len(room_users) == 2:
+            first, second = room_users.values()
+            if exclude_websocket is first or exclude_websocket is second:
+                self._enqueue(second if exclude_websocket is first else first, payload)
+                return
+        
+        for connection in room_users.values():
             if connection == exclude_websocket:
                 continue
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting to connection: {e}")
-                disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
+            self._enqueue(connection, payload)
     
     async def _broadcast_to_others(self, sender_websocket: WebSocket, room_id: str, message: dict):
         """Broadcast a message to all other connections in a room (excluding sender)."""
@@ -173,11 +259,10 @@ class ConnectionManager:
         message_type = message.get("type")
         
         # Validate message type
-        valid_types = ["offer", "answer", "ice-candidate", "join", "leave", "emoji", "mute-status"]
-        if message_type not in valid_types:
+        if message_type not in VALID_MESSAGE_TYPES:
             await self.send_personal_message({
                 "type": "error",
-                "message": f"Invalid message type. Must be one of: {valid_types}"
+                "message": INVALID_TYPE_ERROR
             }, websocket)
             return
         
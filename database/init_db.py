@@ -2,8 +2,8 @@
 Script to initialize PostgreSQL database for video conferencing application.
 Run this script once to set up the database schema.
 """
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+import asyncio
+import asyncpg
 import os
 from dotenv import load_dotenv
 
@@ -14,50 +14,41 @@ def get_db_config():
     """Get database configuration from environment variables."""
     return {
         'host': os.getenv('DB_HOST', 'localhost'),
-        'port': os.getenv('DB_PORT', '5432'),
+        'port': int(os.getenv('DB_PORT', '5432')),
         'database': os.getenv('DB_NAME', 'video_conferencing'),
         'user': os.getenv('DB_USER', 'postgres'),
         'password': os.getenv('DB_PASSWORD', '')
     }
 
-def create_database():
+async def create_database():
     """Create the database if it doesn't exist."""
     config = get_db_config()
     db_name = config.pop('database')
     
     try:
         # Connect to postgres database to create new database
-        conn = psycopg2.connect(
-            host=config['host'],
-            port=config['port'],
-            user=config['user'],
-            password=config['password'],
-            database='postgres'  # Connect to default postgres database
-        )
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        cursor = conn.cursor()
+        # (asyncpg runs statements outside a transaction unless asked to)
+        conn = await asyncpg.connect(**config, database='postgres')
+        try:
+            # Check if database exists
+            exists = await conn.fetchval(
+                "SELECT 1 FROM pg_database WHERE datname = $1",
+                db_name
+            )
+            
+            if not exists:
+                await conn.execute(f'CREATE DATABASE {db_name}')
+                print(f"✅ Database '{db_name}' created successfully!")
+            else:
+                print(f"ℹ️  Database '{db_name}' already exists.")
+        finally:
+            await conn.close()
         
-        # Check if database exists
-        cursor.execute(
-            "SELECT 1 FROM pg_database WHERE datname = %s",
-            (db_name,)
-        )
-        exists = cursor.fetchone()
-        
-        if not exists:
-            cursor.execute(f'CREATE DATABASE {db_name}')
-            print(f"✅ Database '{db_name}' created successfully!")
-        else:
-            print(f"ℹ️  Database '{db_name}' already exists.")
-        
-        cursor.close()
-        conn.close()
-        
-    except psycopg2.Error as e:
+    except asyncpg.PostgresError as e:
         print(f"❌ Error creating database: {e}")
         raise
 
-def init_schema():
+async def init_schema():
     """Initialize database schema by running SQL file."""
     config = get_db_config()
     
@@ -66,32 +57,35 @@ def init_schema():
         with open('database/schema.sql', 'r') as f:
             schema_sql = f.read()
         
-        conn = psycopg2.connect(**config)
-        cursor = conn.cursor()
-        
-        # Execute schema
-        cursor.execute(schema_sql)
-        conn.commit()
+        conn = await asyncpg.connect(**config)
+        try:
+            # Without arguments asyncpg sends the whole script as one simple
+            # query, so every statement goes in a single round trip
+            async with conn.transaction():
+                await conn.execute(schema_sql)
+        finally:
+            await conn.close()
         
         print("✅ Database schema initialized successfully!")
         
-        cursor.close()
-        conn.close()
-        
-    except psycopg2.Error as e:
+    except asyncpg.PostgresError as e:
         print(f"❌ Error initializing schema: {e}")
         raise
     except FileNotFoundError:
         print("❌ Error: database/schema.sql file not found!")
         raise
 
+async def main():
+    await create_database()
+    await init_schema()
+
+
 if __name__ == '__main__':
     print("🚀 Initializing PostgreSQL database...")
     print("-" * 50)
     
     try:
-        create_database()
-        init_schema()
+        asyncio.run(main())
         print("-" * 50)
         print("✅ Database setup completed successfully!")
     except Exception as e:
@@ -28,9 +28,14 @@ CREATE TABLE IF NOT EXISTS participants (
     joined_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     left_at TIMESTAMP WITH TIME ZONE,
     status VARCHAR(50) DEFAULT 'active' CHECK (status IN ('active', 'left')),
-    CONSTRAINT unique_room_user UNIQUE(room_id, user_id, status)
+    CONSTRAINT unique_room_user UNIQUE(room_id, user_id)
 );
 
+-- Databases created before join_room became an upsert have unique_room_user
+-- on (room_id, user_id, status); rebuild it on (room_id, user_id)
+ALTER TABLE participants DROP CONSTRAINT IF EXISTS unique_room_user;
+ALTER TABLE participants ADD CONSTRAINT unique_room_user UNIQUE(room_id, user_id);
+
 -- Sessions table (WebSocket connections)
 CREATE TABLE IF NOT EXISTS sessions (
     session_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -44,13 +49,19 @@ CREATE TABLE IF NOT EXISTS sessions (
 -- Indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_rooms_status ON rooms(status);
 CREATE INDEX IF NOT EXISTS idx_rooms_created_at ON rooms(created_at);
+CREATE INDEX IF NOT EXISTS idx_rooms_created_at_room_id ON rooms(created_at DESC, room_id DESC);
 CREATE INDEX IF NOT EXISTS idx_participants_room_id ON participants(room_id);
 CREATE INDEX IF NOT EXISTS idx_participants_user_id ON participants(user_id);
 CREATE INDEX IF NOT EXISTS idx_participants_status ON participants(status);
+CREATE INDEX IF NOT EXISTS idx_participants_joined_at_id ON participants(joined_at DESC, participant_id DESC);
 CREATE INDEX IF NOT EXISTS idx_sessions_room_id ON sessions(room_id);
 CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id);
 CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions(status);
 
+-- Partial indexes for the hot room-membership predicates
+CREATE INDEX IF NOT EXISTS participants_room_status_idx ON participants(room_id, status) WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS sessions_room_status_idx ON sessions(room_id, status) WHERE status = 'connected';
+
 -- Function to get active participants count
 CREATE OR REPLACE FUNCTION get_active_participants_count(p_room_id UUID)
 RETURNS INTEGER AS $$
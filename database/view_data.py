@@ -2,10 +2,13 @@
 Script to view data from PostgreSQL database.
 Run this to see all rooms, participants, and sessions.
 """
+import asyncio
+import io
 import os
 import sys
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+import uuid
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -19,116 +22,155 @@ DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 
 # Create database URL
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-def view_rooms(db_session):
+# Room detail lookups run at once (the engine's default pool holds 5 connections)
+ROOM_DETAILS_CONCURRENCY = 5
+
+# Placeholder for missing values in the tables below
+NOT_AVAILABLE = 'N/A'
+
+# Table row layouts, shared by each table's header and rows; binding .format
+# once keeps the per-row work in the loops below to a single call
+ROOM_ROW = "{:<40} {:<20} {:<15} {:<10} {:<12}\n".format
+PARTICIPANT_ROW = "{:<40} {:<40} {:<20} {:<10} {:<20}\n".format
+SESSION_ROW = "{:<40} {:<40} {:<20} {:<10}\n".format
+
+def format_timestamp(value):
+    """Format a timestamp as YYYY-MM-DD HH:MM:SS (isoformat is a cheaper C path than strftime)."""
+    if not value:
+        return NOT_AVAILABLE
+    # Drop the UTC offset isoformat appends for timestamptz columns
+    return value.isoformat(sep=' ', timespec='seconds')[:19]
+
+async def fetch_rooms(engine):
+    """Fetch all rooms with their active participant counts."""
+    async with engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT 
+                r.room_id,
+                r.created_at,
+                r.created_by,
+                r.status,
+                COUNT(p.participant_id) FILTER (WHERE p.status = 'active') as participant_count
+            FROM rooms r
+            LEFT JOIN participants p ON p.room_id = r.room_id
+            GROUP BY r.room_id
+            ORDER BY r.created_at DESC
+        """))
+        return result.fetchall()
+
+def view_rooms(rooms):
     """View all rooms."""
-    print("\n" + "="*80)
-    print("ROOMS")
-    print("="*80)
-    
-    result = db_session.execute(text("""
-        SELECT 
-            room_id,
-            created_at,
-            created_by,
-            status,
-            (SELECT COUNT(*) FROM participants WHERE room_id = rooms.room_id AND status = 'active') as participant_count
-        FROM rooms
-        ORDER BY created_at DESC
-    """))
-    
-    rooms = result.fetchall()
+    buf = io.StringIO()
+    buf.write("\n" + "="*80 + "\n")
+    buf.write("ROOMS\n")
+    buf.write("="*80 + "\n")
     
     if not rooms:
-        print("No rooms found.")
+        buf.write("No rooms found.\n")
+        sys.stdout.write(buf.getvalue())
         return
     
-    print(f"{'Room ID':<40} {'Created At':<20} {'Created By':<15} {'Status':<10} {'Participants':<12}")
-    print("-" * 80)
+    buf.write(ROOM_ROW('Room ID', 'Created At', 'Created By', 'Status', 'Participants'))
+    buf.write("-" * 80 + "\n")
     
-    for room in rooms:
-        room_id, created_at, created_by, status, count = room
-        created_at_str = created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else 'N/A'
-        print(f"{str(room_id):<40} {created_at_str:<20} {created_by or 'N/A':<15} {status:<10} {count:<12}")
+    write, row = buf.write, ROOM_ROW
+    for room_id, created_at, created_by, status, count in rooms:
+        write(row(str(room_id), format_timestamp(created_at), created_by or NOT_AVAILABLE, status, count))
+    sys.stdout.write(buf.getvalue())
+
+async def fetch_participants(engine):
+    """Fetch the 50 most recently joined participants."""
+    # A plain fetch rather than a server-side cursor: LIMIT 50 fits in one
+    # round trip, and main() renders rows only after every query has finished
+    async with engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT 
+                p.participant_id,
+                p.room_id,
+                p.user_id,
+                p.username,
+                p.joined_at,
+                p.left_at,
+                p.status,
+                r.created_at as room_created
+            FROM participants p
+            LEFT JOIN rooms r ON p.room_id = r.room_id
+            ORDER BY p.joined_at DESC
+            LIMIT 50
+        """))
+        return result.fetchall()
 
-def view_participants(db_session):
+def view_participants(participants):
     """View all participants."""
-    print("\n" + "="*80)
-    print("PARTICIPANTS")
-    print("="*80)
-    
-    result = db_session.execute(text("""
-        SELECT 
-            p.participant_id,
-            p.room_id,
-            p.user_id,
-            p.username,
-            p.joined_at,
-            p.left_at,
-            p.status,
-            r.created_at as room_created
-        FROM participants p
-        LEFT JOIN rooms r ON p.room_id = r.room_id
-        ORDER BY p.joined_at DESC
-        LIMIT 50
-    """))
-    
-    participants = result.fetchall()
+    buf = io.StringIO()
+    buf.write("\n" + "="*80 + "\n")
+    buf.write("PARTICIPANTS\n")
+    buf.write("="*80 + "\n")
     
     if not participants:
-        print("No participants found.")
+        buf.write("No participants found.\n")
+        sys.stdout.write(buf.getvalue())
         return
     
-    print(f"{'Room ID':<40} {'User ID':<40} {'Username':<20} {'Status':<10} {'Joined At':<20}")
-    print("-" * 80)
+    buf.write(PARTICIPANT_ROW('Room ID', 'User ID', 'Username', 'Status', 'Joined At'))
+    buf.write("-" * 80 + "\n")
     
-    for p in participants:
-        participant_id, room_id, user_id, username, joined_at, left_at, status, room_created = p
-        joined_str = joined_at.strftime('%Y-%m-%d %H:%M:%S') if joined_at else 'N/A'
-        print(f"{str(room_id):<40} {str(user_id):<40} {username or 'N/A':<20} {status:<10} {joined_str:<20}")
+    write, row = buf.write, PARTICIPANT_ROW
+    for participant_id, room_id, user_id, username, joined_at, left_at, status, room_created in participants:
+        write(row(str(room_id), str(user_id), username or NOT_AVAILABLE, status, format_timestamp(joined_at)))
+    sys.stdout.write(buf.getvalue())
 
-def view_sessions(db_session):
+async def fetch_sessions(engine):
+    """Fetch all active sessions."""
+    async with engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT 
+                s.session_id,
+                s.room_id,
+                s.user_id,
+                s.connected_at,
+                s.disconnected_at,
+                s.status
+            FROM sessions s
+            WHERE s.status = 'connected'
+            ORDER BY s.connected_at DESC
+        """))
+        return result.fetchall()
+
+def view_sessions(sessions):
     """View all active sessions."""
-    print("\n" + "="*80)
-    print("ACTIVE SESSIONS (WebSocket Connections)")
-    print("="*80)
-    
-    result = db_session.execute(text("""
-        SELECT 
-            s.session_id,
-            s.room_id,
-            s.user_id,
-            s.connected_at,
-            s.disconnected_at,
-            s.status
-        FROM sessions s
-        WHERE s.status = 'connected'
-        ORDER BY s.connected_at DESC
-    """))
-    
-    sessions = result.fetchall()
+    buf = io.StringIO()
+    buf.write("\n" + "="*80 + "\n")
+    buf.write("ACTIVE SESSIONS (WebSocket Connections)\n")
+    buf.write("="*80 + "\n")
     
     if not sessions:
-        print("No active sessions found.")
+        buf.write("No active sessions found.\n")
+        sys.stdout.write(buf.getvalue())
         return
     
-    print(f"{'Room ID':<40} {'User ID':<40} {'Connected At':<20} {'Status':<10}")
-    print("-" * 80)
+    buf.write(SESSION_ROW('Room ID', 'User ID', 'Connected At', 'Status'))
+    buf.write("-" * 80 + "\n")
     
-    for s in sessions:
-        session_id, room_id, user_id, connected_at, disconnected_at, status = s
-        connected_str = connected_at.strftime('%Y-%m-%d %H:%M:%S') if connected_at else 'N/A'
-        print(f"{str(room_id):<40} {str(user_id):<40} {connected_str:<20} {status:<10}")
-
-def view_room_details(db_session, room_id=None):
-    """View detailed information about a specific room."""
-    if room_id:
-        print(f"\n" + "="*80)
-        print(f"ROOM DETAILS: {room_id}")
-        print("="*80)
-        
-        result = db_session.execute(text("""
+    write, row = buf.write, SESSION_ROW
+    for session_id, room_id, user_id, connected_at, disconnected_at, status in sessions:
+        write(row(str(room_id), str(user_id), format_timestamp(connected_at), status))
+    sys.stdout.write(buf.getvalue())
+
+async def fetch_room_details(engine, room_id):
+    """
+    Fetch a room's summary row and its participants. Returns (room, participants);
+    room is None when no room has that id, including ids that aren't UUIDs.
+    """
+    try:
+        uuid.UUID(room_id)
+    except ValueError:
+        return None, []
+    
+    async with engine.connect() as conn:
+        result = await conn.execute(text("""
             SELECT 
                 r.room_id,
                 r.created_at,
@@ -143,90 +185,147 @@ def view_room_details(db_session, room_id=None):
         """), {"room_id": room_id})
         
         room = result.fetchone()
+        if not room:
+            return None, []
         
-        if room:
-            print(f"Room ID: {room[0]}")
-            print(f"Created At: {room[1]}")
-            print(f"Created By: {room[2] or 'N/A'}")
-            print(f"Status: {room[3]}")
-            print(f"Active Participants: {room[4]}")
-            print(f"Total Participants: {room[5]}")
-            
-            # Show participants
-            participants_result = db_session.execute(text("""
-                SELECT user_id, username, joined_at, status
-                FROM participants
-                WHERE room_id = :room_id
-                ORDER BY joined_at DESC
-            """), {"room_id": room_id})
-            
-            participants = participants_result.fetchall()
-            if participants:
-                print("\nParticipants:")
-                for p in participants:
-                    print(f"  - User: {p[0]} ({p[1] or 'No name'}) | Joined: {p[2]} | Status: {p[3]}")
-        else:
-            print(f"Room {room_id} not found.")
+        participants_result = await conn.execute(text("""
+            SELECT user_id, username, joined_at, status
+            FROM participants
+            WHERE room_id = :room_id
+            ORDER BY joined_at DESC
+        """), {"room_id": room_id})
+        return room, participants_result.fetchall()
+
+def view_room_details(room_id, room, participants, error=None):
+    """View detailed information about a specific room, or the error that stopped it loading."""
+    buf = io.StringIO()
+    buf.write(f"\n" + "="*80 + "\n")
+    buf.write(f"ROOM DETAILS: {room_id}\n")
+    buf.write("="*80 + "\n")
+    
+    if error is not None:
+        buf.write(f"Room {room_id} could not be loaded: {error}\n")
+    elif room:
+        buf.write(f"Room ID: {room[0]}\n")
+        buf.write(f"Created At: {room[1]}\n")
+        buf.write(f"Created By: {room[2] or NOT_AVAILABLE}\n")
+        buf.write(f"Status: {room[3]}\n")
+        buf.write(f"Active Participants: {room[4]}\n")
+        buf.write(f"Total Participants: {room[5]}\n")
+        
+        # Show participants
+        if participants:
+            buf.write("\nParticipants:\n")
+            for p in participants:
+                buf.write(f"  - User: {p[0]} ({p[1] or 'No name'}) | Joined: {p[2]} | Status: {p[3]}\n")
     else:
-        print("Please provide a room_id to view details.")
+        buf.write(f"Room {room_id} not found.\n")
+    sys.stdout.write(buf.getvalue())
 
-def view_statistics(db_session):
+async def fetch_statistics(engine):
+    """Fetch database statistics."""
+    async with engine.connect() as conn:
+        # One scan per table; each table's counts come from FILTER aggregates
+        result = await conn.execute(text("""
+            SELECT 
+                r.active_rooms,
+                r.ended_rooms,
+                p.active_participants,
+                p.left_participants,
+                s.active_sessions
+            FROM (
+                SELECT
+                    COUNT(*) FILTER (WHERE status = 'active') as active_rooms,
+                    COUNT(*) FILTER (WHERE status = 'ended') as ended_rooms
+                FROM rooms
+            ) r
+            CROSS JOIN (
+                SELECT
+                    COUNT(*) FILTER (WHERE status = 'active') as active_participants,
+                    COUNT(*) FILTER (WHERE status = 'left') as left_participants
+                FROM participants
+            ) p
+            CROSS JOIN (
+                SELECT COUNT(*) as active_sessions
+                FROM sessions
+                WHERE status = 'connected'
+            ) s
+        """))
+        return result.fetchone()
+
+def view_statistics(stat):
     """View database statistics."""
-    print("\n" + "="*80)
-    print("DATABASE STATISTICS")
-    print("="*80)
-    
-    stats = db_session.execute(text("""
-        SELECT 
-            (SELECT COUNT(*) FROM rooms WHERE status = 'active') as active_rooms,
-            (SELECT COUNT(*) FROM rooms WHERE status = 'ended') as ended_rooms,
-            (SELECT COUNT(*) FROM participants WHERE status = 'active') as active_participants,
-            (SELECT COUNT(*) FROM participants WHERE status = 'left') as left_participants,
-            (SELECT COUNT(*) FROM sessions WHERE status = 'connected') as active_sessions
-    """))
+    buf = io.StringIO()
+    buf.write("\n" + "="*80 + "\n")
+    buf.write("DATABASE STATISTICS\n")
+    buf.write("="*80 + "\n")
     
-    stat = stats.fetchone()
     active_rooms, ended_rooms, active_participants, left_participants, active_sessions = stat
     
-    print(f"Active Rooms: {active_rooms}")
-    print(f"Ended Rooms: {ended_rooms}")
-    print(f"Active Participants: {active_participants}")
-    print(f"Left Participants: {left_participants}")
-    print(f"Active Sessions: {active_sessions}")
+    buf.write(f"Active Rooms: {active_rooms}\n")
+    buf.write(f"Ended Rooms: {ended_rooms}\n")
+    buf.write(f"Active Participants: {active_participants}\n")
+    buf.write(f"Left Participants: {left_participants}\n")
+    buf.write(f"Active Sessions: {active_sessions}\n")
+    sys.stdout.write(buf.getvalue())
 
-def main():
+async def main():
     """Main function to view database data."""
+    room_ids = sys.argv[1:]
     try:
-        # Create engine and session
-        engine = create_engine(DATABASE_URL)
-        Session = sessionmaker(bind=engine)
-        db_session = Session()
+        # Create engine; each fetch below checks out its own pooled connection
+        engine = create_async_engine(DATABASE_URL)
+        
+        # The queries are independent, so run them concurrently: total wait is
+        # the slowest query rather than the sum of all of them
+        fetches = [
+            fetch_statistics(engine),
+            fetch_rooms(engine),
+            fetch_participants(engine),
+            fetch_sessions(engine)
+        ]
+        # Bound the detail lookups so many room ids don't exhaust the connection pool
+        detail_slots = asyncio.Semaphore(ROOM_DETAILS_CONCURRENCY)
+        
+        async def fetch_details(room_id):
+            # A failed lookup is returned, not raised, so it only affects its own room
+            async with detail_slots:
+                try:
+                    return await fetch_room_details(engine, room_id)
+                except Exception as e:
+                    return e
+        
+        fetches.extend(fetch_details(room_id) for room_id in room_ids)
+        try:
+            stats, rooms, participants, sessions, *details = await asyncio.gather(*fetches)
+        finally:
+            await engine.dispose()
         
         print("\n" + "="*80)
         print("VIDEO CONFERENCING DATABASE VIEWER")
         print("="*80)
         
         # Show statistics
-        view_statistics(db_session)
+        view_statistics(stats)
         
         # Show all data
-        view_rooms(db_session)
-        view_participants(db_session)
-        view_sessions(db_session)
+        view_rooms(rooms)
+        view_participants(participants)
+        view_sessions(sessions)
         
-        # If room_id provided as argument, show details
-        if len(sys.argv) > 1:
-            room_id = sys.argv[1]
-            view_room_details(db_session, room_id)
-        
-        db_session.close()
+        # If room ids provided as arguments, show details for each
+        for room_id, result in zip(room_ids, details):
+            if isinstance(result, Exception):
+                view_room_details(room_id, None, [], error=result)
+            else:
+                view_room_details(room_id, *result)
         
         print("\n" + "="*80)
         print("Done!")
         print("="*80)
         print("\nUsage:")
         print("  python database/view_data.py              # View all data")
-        print("  python database/view_data.py <room_id>    # View specific room details")
+        print("  python database/view_data.py <room_id>... # View specific room details")
         
     except Exception as e:
         print(f"\n❌ Error connecting to database: {e}")
@@ -237,6 +336,5 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
-    main()
-
+    asyncio.run(main())
 
@@ -442,8 +442,12 @@ function VideoCall({ roomId, username, onLeave }) {
     ws.onmessage = (event) => {
       try {
         const message = JSON.parse(event.data);
-        console.log('Received WebSocket message:', message.type, message);
-        handleSignalingMessage(message);
+        // Backend coalesces messages queued during a slow send into one frame
+        const messages = message.type === 'batch' ? message.messages : [message];
+        messages.forEach((msg) => {
+          console.log('Received WebSocket message:', msg.type, msg);
+          handleSignalingMessage(msg);
+        });
       } catch (error) {
         console.error('Error parsing WebSocket message:', error, event.data);
       }
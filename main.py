@@ -1,51 +1,63 @@
 """
 FastAPI backend for video conferencing application with WebRTC signaling.
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+import logging
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from typing import List
+import orjson
 import uvicorn
 
+from app import config
 from app.models import RoomCreateResponse, RoomInfo
-from app.room_manager import room_manager
+from app.dependencies import get_room_manager
 from app.websocket_handler import manager
-from app.admin import router as admin_router
-import os
-from dotenv import load_dotenv
+from app import admin
 
-# Load environment variables
-load_dotenv()
+# app.dependencies has already checked that the database modules import
+if config.USE_DATABASE:
+    from app.database import SessionLocal, engine, Base, upgrade_schema
+    from app.room_manager_db import participant_batcher, warm_room_cache
 
-# Check if database is configured
-# Render provides DATABASE_URL automatically when database is linked
-USE_DATABASE = bool(os.getenv('DATABASE_URL') or (os.getenv('DB_PASSWORD') and os.getenv('DB_NAME')))
+logger = logging.getLogger(__name__)
 
-if USE_DATABASE:
-    try:
-        from app.database import get_db, engine, Base
-        from app.room_manager_db import RoomManagerDB
-        # Create tables if they don't exist
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database connected - Using PostgreSQL")
-    except Exception as e:
-        print(f"⚠️  Database connection failed: {e}")
-        print("⚠️  Falling back to in-memory storage")
-        USE_DATABASE = False
-else:
-    print("ℹ️  Using in-memory storage (PostgreSQL not configured)")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create database tables and warm the room cache on startup (the async engine needs a running loop)."""
+    config.start_logging()
+    if config.USE_DATABASE:
+        try:
+            # Create tables if they don't exist, then add any newer constraints/indexes
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(upgrade_schema)
+            async with SessionLocal() as db:
+                await warm_room_cache(db)
+            print("✅ Database connected - Using PostgreSQL")
+        except Exception as e:
+            print(f"⚠️  Database connection failed: {e}")
+            print("⚠️  Falling back to in-memory storage")
+            config.USE_DATABASE = False
+    yield
+    if config.USE_DATABASE:
+        await participant_batcher.flush_pending()
+        await engine.dispose()
+    config.stop_logging()
 
 
 app = FastAPI(
     title="Video Conferencing Backend",
     description="Backend API for Zoom-like video conferencing with WebRTC signaling",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Include admin router (only if database is configured)
-try:
-    app.include_router(admin_router)
-except Exception as e:
-    print(f"Warning: Admin endpoints not available: {e}")
+if admin.DB_CONFIGURED:
+    app.include_router(admin.router)
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -56,6 +68,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger HTTP responses (admin room/participant lists) for clients
+# that send Accept-Encoding: gzip; WebSocket traffic is not affected
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 
 @app.get("/")
 async def root():
@@ -72,76 +88,37 @@ async def root():
 
 
 @app.post("/create-room", response_model=RoomCreateResponse)
-async def create_room():
+async def create_room(rooms=Depends(get_room_manager)):
     """
     Create a new video conference room.
     Returns a room ID and join link.
     """
-    if USE_DATABASE:
-        db = next(get_db())
-        try:
-            db_manager = RoomManagerDB(db)
-            room_id = db_manager.create_room()
-            join_link = f"/room/{room_id}"
-            return RoomCreateResponse(
-                room_id=room_id,
-                join_link=join_link,
-                message=f"Room {room_id} created successfully"
-            )
-        finally:
-            db.close()
-    else:
-        room_id = room_manager.create_room()
-        join_link = f"/room/{room_id}"
-        return RoomCreateResponse(
-            room_id=room_id,
-            join_link=join_link,
-            message=f"Room {room_id} created successfully"
-        )
+    room_id = await rooms.create_room()
+    join_link = f"/room/{room_id}"
+    return RoomCreateResponse(
+        room_id=room_id,
+        join_link=join_link,
+        message=f"Room {room_id} created successfully"
+    )
 
 
 @app.get("/rooms", response_model=List[RoomInfo])
-async def list_rooms():
+async def list_rooms(rooms=Depends(get_room_manager)):
     """
     List all active rooms with participant counts.
     """
-    if USE_DATABASE:
-        db = next(get_db())
-        try:
-            db_manager = RoomManagerDB(db)
-            return db_manager.get_all_rooms()
-        finally:
-            db.close()
-    else:
-        return room_manager.get_all_rooms()
+    return await rooms.get_all_rooms()
 
 
 @app.get("/rooms/{room_id}")
-async def get_room_info(room_id: str):
+async def get_room_info(room_id: str, rooms=Depends(get_room_manager)):
     """
     Get information about a specific room.
     """
-    if USE_DATABASE:
-        db = next(get_db())
-        try:
-            db_manager = RoomManagerDB(db)
-            room_info = db_manager.get_room_info(room_id)
-            if not room_info:
-                raise HTTPException(status_code=404, detail="Room not found")
-            return room_info
-        finally:
-            db.close()
-    else:
-        if not room_manager.room_exists(room_id):
-            raise HTTPException(status_code=404, detail="Room not found")
-        
-        participants = room_manager.get_room_participants(room_id)
-        return {
-            "room_id": room_id,
-            "participant_count": len(participants),
-            "participants": list(participants),
-            "exists": True
-        }
+    room_info = await rooms.get_room_info(room_id)
+    if not room_info:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return room_info
 
 
 @app.websocket("/ws/{room_id}")
@@ -163,7 +140,6 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
         "data": { ... } (SDP or ICE candidate data)
     }
     """
-    user_id = None
     try:
         # Connect the WebSocket
         user_id = await manager.connect(websocket, room_id)
@@ -179,16 +155,32 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
         # Listen for messages
         while True:
             try:
-                # Receive message from client
-                data = await websocket.receive_json()
+                # Receive message from client (text or binary frame)
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                # orjson parses bytes directly, so binary frames skip the UTF-8 decode
+                data = orjson.loads(message.get("bytes") or message.get("text"))
+                if not isinstance(data, dict):
+                    # Valid JSON, but not a signaling message (e.g. a list or a number)
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": "Invalid message: expected a JSON object"
+                    }, websocket)
+                    continue
                 
                 # Handle signaling message
                 await manager.handle_signaling_message(websocket, data)
                 
             except WebSocketDisconnect:
                 break
+            except orjson.JSONDecodeError:
+                await manager.send_personal_message({
+                    "type": "error",
+                    "message": "Invalid message: expected a JSON object"
+                }, websocket)
             except Exception as e:
-                print(f"Error handling message: {e}")
+                logger.warning("Error handling message: %s", e)
                 await manager.send_personal_message({
                     "type": "error",
                     "message": f"Error processing message: {str(e)}"
@@ -196,7 +188,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
     
     except ValueError as e:
         # Room doesn't exist
-        print(f"Connection error: {e}")
+        logger.warning("Connection error: %s", e)
         if websocket.client_state.name == "CONNECTED":
             await websocket.close(code=1008, reason=str(e))
     
@@ -205,9 +197,11 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
         pass
     
     finally:
-        # Clean up on disconnect
-        if user_id:
-            room_id, user_id = manager.disconnect(websocket)
+        # Clean up on disconnect; always called so a socket that fails partway
+        # through connect() is still dropped from every connection map
+        info = await manager.disconnect(websocket)
+        if info is not None:
+            room_id, user_id = info
             # Notify other participants
             await manager.broadcast_to_room(room_id, {
                 "type": "user-left",
@@ -222,7 +216,13 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        # uvloop/httptools are picked automatically when installed via uvicorn[standard].
+        # Signaling frames are small JSON, so per-message compression only costs CPU.
+        ws_per_message_deflate=False,
+        ws_max_size=4 * 1024 * 1024,
+        # Room for connect storms (e.g. a whole meeting rejoining) in the accept queue
+        backlog=4096
     )
 
 